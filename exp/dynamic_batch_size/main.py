@@ -1,23 +1,56 @@
-from collections import deque
-import csv
-import enum
-from hmac import new
+import gc
 import json
 import logging
 import argparse
-import random
 
 import math
+import pandas as pd
 from performance import get_performance_metrics
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-from scheuler.dynamic_scheduler import DynamicScheduler
-from scheuler.largest_batch_scheduler import LargestBatchScheduler 
-from utils import SortedQueue
-from vary_trace import *
+
+from scheduler.largest_batch_scheduler import LargestBatchScheduler 
+from utils import ArrivalQueue, SortedQueue
+from vary_trace import generate_trace_with_multiple_concurrent_users, generate_trace_with_simple_compression
 
 
 batch_runtimes = {}
+# batch_runtimes as a list indexed by batch size, filled in once the profile is read
+BATCH_RT = []
+BATCH_RT_1 = None
+
+class BufferedFileHandler(logging.FileHandler):
+    """FileHandler with a large write buffer, flushed on close instead of after every record"""
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=1 << 20, encoding=self.encoding, errors=self.errors)
+
+    def flush(self):
+        # StreamHandler.emit flushes after every record, leave that to the buffer;
+        # close() still writes everything out when it closes the stream
+        pass
+
+    def flush_buffer(self):
+        """Write out the buffered records now"""
+        self.acquire()
+        try:
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+def write_json(data, filename):
+    """Write data as indented JSON, using orjson when it is available"""
+    if orjson is not None:
+        # queue_at_each_interval is keyed by time and request id, not str
+        with open(filename, 'wb') as jsonfile:
+            jsonfile.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(filename, 'w') as jsonfile:
+            json.dump(data, jsonfile, indent=2)
 
 def setup_logging(log_level_str="INFO", scheduler_name="", preemption=False, trace_variation="", slo_factor=None, slo_csv=None, max_batch_size=None, output_file=None):
     """Set up logging with specified level"""
@@ -48,22 +81,27 @@ def setup_logging(log_level_str="INFO", scheduler_name="", preemption=False, tra
         batch_suffix = f"-batch-{max_batch_size}" if max_batch_size is not None else ""
         log_filename = f'./output/{scheduler_name}{preemption_suffix}{trace_suffix}{slo_suffix}{batch_suffix}.log'
     
+    handlers = [BufferedFileHandler(log_filename, mode='w')]
+    # only echo to the console when the log is quiet enough to read
+    if log_level <= logging.INFO:
+        handlers.append(logging.StreamHandler())
     logging.basicConfig(
         level=log_level,
         format='%(filename)20s:%(lineno)4d - %(levelname)8s - %(message)s',
-        handlers=[
-                logging.FileHandler(log_filename, mode='w'),
-            logging.StreamHandler()
-        ]
+        handlers=handlers
     )
     return logging.getLogger(__name__)
 
-class Event(enum.Enum):
-    CHECK_PREEMPTION = "check preemption"
-    BATCH_FINISHED = "batch finished"
-    NEW_REQS_ARRIVED = "new reqs arrived"
+# event codes, plain ints so the event loop compares them without going through Enum
+EVENT_CHECK_PREEMPTION = 0
+EVENT_BATCH_FINISHED = 1
+EVENT_NEW_REQS_ARRIVED = 2
+EVENT_NAMES = ("check preemption", "batch finished", "new reqs arrived")
 
 class Request:
+    # in the order fields are set in __init__, which is also the key order of to_dict()
+    __slots__ = ('arrival_time', 'id', 'queue_time', 'dropped_time', 'execution_time', 'finish_time', 'batch_size', 'slo_factor', 'deadline')
+
     arrival_time: int
     id: int
     queue_time: float
@@ -83,7 +121,7 @@ class Request:
         self.finish_time = None
         self.batch_size = None
         self.slo_factor = slo_factor
-        self.deadline = self.arrival_time + self.slo_factor * batch_runtimes[1]
+        self.deadline = self.arrival_time + self.slo_factor * BATCH_RT_1
 
     def __str__(self):
         return f"Request(id={self.id}, arrival_time={self.arrival_time}, slo_factor={self.slo_factor}, deadline={self.deadline})" if self.queue_time is None else f"Request(id={self.id}, arrival_time={self.arrival_time}, slo_factor={self.slo_factor}, deadline={self.deadline}, queue_time={self.queue_time}, batch_size={self.batch_size}, execution_time={self.execution_time}, finish_time={self.finish_time}, dropped_time={self.dropped_time})"
@@ -106,38 +144,166 @@ class Request:
     def __repr__(self):
         return self.__str__()
 
+    def to_dict(self):
+        return {field: getattr(self, field) for field in Request.__slots__}
+
 
 
 queue = SortedQueue(sort_by="deadline")
-future_requests = SortedQueue(sort_by="arrival_time")
 finished_requests = []
 
 queue_at_each_interval = {}
 
 
-current_batch = SortedQueue(sort_by="deadline")
+current_batch = []
 current_time = float (0)
-batch_finish_time = math.inf
 
 
 
-def fetch_new_requests(current_time: int, future_requests: SortedQueue, queue: SortedQueue):
-    new_reqs = []
-    while len(future_requests) > 0 and future_requests[0].arrival_time <= current_time:
-        req = future_requests.pop()
-        queue.append(req)
-        new_reqs.append(req.id)
-    return new_reqs
+def fetch_new_requests(current_time: int, future_requests: ArrivalQueue, queue: SortedQueue):
+    new_reqs = future_requests.fetch(current_time)
+    queue.extend(new_reqs)
+    return [req.id for req in new_reqs]
+
+def advance(current_time: float, future_requests: ArrivalQueue, queue: SortedQueue, finished_requests: list[Request], return_ids: bool):
+    """
+    Move the requests that arrived by current_time into the queue, then drop the ones that can no longer meet their deadline.
+    Returns the (new, dropped) request ids, or (None, None) when return_ids is False.
+    """
+    new_reqs = future_requests.fetch(current_time)
+    queue.extend(new_reqs)
 
-def drop_requests(current_time: int, queue: SortedQueue, finished_requests: list[Request]):
-    dropped_reqs = []
-    while len(queue) > 0 and queue[0].deadline < current_time + batch_runtimes[1]:
-        req = queue.pop()
+    dropped_reqs = queue.pop_before(current_time + BATCH_RT_1)
+    for req in dropped_reqs:
         req.get_dropped(current_time)
-        finished_requests.append(req)
-        dropped_reqs.append(req.id)
+    finished_requests.extend(dropped_reqs)
+
+    if not return_ids:
+        return None, None
+    return [req.id for req in new_reqs], [req.id for req in dropped_reqs]
+
+
+def run_sim(scheduler, queue: SortedQueue, future_requests: ArrivalQueue, current_batch: list[Request], finished_requests: list[Request], queue_at_each_interval: dict, current_time: float, logger: logging.Logger, preemption: bool):
+    """Run the event loop until every request has finished or been dropped"""
+    # bind everything the loop touches to locals, so each use is a LOAD_FAST instead of a global or attribute lookup
+    INF = math.inf
+    batch_rt = BATCH_RT
+    schedule = scheduler.schedule
+    preempt = scheduler.preempt
+    advance_to = advance
+    # checked once, so the per-event messages below are only built when they will be written
+    INFO_ON = logger.isEnabledFor(logging.INFO)
+
+    batch_finish_time = INF
+    num_iters = 0;
+    while (True):
+
+        # container sizes are cached in nb/nf and refreshed only where the containers change
+        nb = len(current_batch)
+
+        # check the event
+        if nb == 0:
+            event = EVENT_NEW_REQS_ARRIVED
+        elif current_time == batch_finish_time:
+            event = EVENT_BATCH_FINISHED
+        else:
+            if not preemption:
+                assert False, f"The event should not be check preemption at this time."
+            event = EVENT_CHECK_PREEMPTION
+
+
+        if INFO_ON:
+            logger.info("\n" + "-"*10  +  f"Current time: {current_time}" + f" ({EVENT_NAMES[event]})" + "-"*10)
+
+        # fetch new reqs and drop expired ones
+        new_reqs, drop_reqs = advance_to(current_time, future_requests, queue, finished_requests, INFO_ON)
+
+        if INFO_ON:
+            if len(new_reqs) > 0:
+                logger.info(f"[New requests] {new_reqs}")
+            logger.info(f"[Dropped requests] {drop_reqs}")
+            logger.info(f"[Current batch] {[req.id for req in current_batch]}")
+            logger.info(f"[Queue] (size: {len(queue)}) {[req.id for req in queue]}")
+        # logger.info(f"[Queue] {queue.requests}")
+
+        # check if we need to do preemption (only reachable with preemption on, see the assert above)
+        if event == EVENT_CHECK_PREEMPTION:
+            # do something
+            if INFO_ON:
+                logger.info(f"[Check preemption] at {current_time}")
+            do_preemption = preempt(current_batch, queue, current_time, batch_finish_time)
+            if do_preemption:
+                if INFO_ON:
+                    logger.info(f"[New scheduled batch] {[req.id for req in current_batch]}")
+                nb = len(current_batch)
+                batch_finish_time = current_time + batch_rt[nb]
+
+
+        # check if the current batch is finished
+        if event == EVENT_BATCH_FINISHED:
+            assert nb > 0, f"The current batch should be finished at this time but the current batch is empty."
+
+            for req in current_batch:
+                assert req.finish_time == current_time, f"The finish time of the request {req.id} is not correct."
+            finished_requests.extend(current_batch)
+            if INFO_ON:
+                logger.info(f"[Batch finished] {[req.id for req in current_batch]}")
+            current_batch.clear()
+            nb = 0
+            batch_finish_time = INF
+
+        # schedule the next batch
+        if event != EVENT_CHECK_PREEMPTION:
+            queue_at_each_interval[current_time] = {req.id: req.deadline - req.arrival_time for req in queue}
+
+            next_check_time, _ = schedule(current_batch, queue, current_time)
+            nb = len(current_batch)
+            if nb > 0:
+                if INFO_ON:
+                    logger.info(f"[Scheduled] {[req.id for req in current_batch]}")
+                duration = batch_rt[nb]
+                batch_finish_time = current_time + duration
+                # update the timestep in the current batch
+                for req in current_batch:
+                    req.schedule(current_time, nb, duration)
+            else:
+                if INFO_ON:
+                    logger.info(f"[No batch scheduled] queue length: {len(queue)}")
+
+        # check if the trace is finished
+        nf = len(future_requests)
+        if nf == 0 and nb == 0 and len(queue) == 0:
+            logger.info("Trace finished")
+            break
+
+        # check what is the next event
+        has_next_req = nf > 0
+        next_req_arrival_time = future_requests.peek().arrival_time if has_next_req else INF
+        if not preemption and batch_finish_time != INF and has_next_req:
+            # without preemption, nothing happens before the running batch finishes
+            current_time = batch_finish_time
+        else:
+            # inlined min(next_check_time, batch_finish_time, next_req_arrival_time)
+            next_time = next_check_time
+            if batch_finish_time < next_time:
+                next_time = batch_finish_time
+            if next_req_arrival_time < next_time:
+                next_time = next_req_arrival_time
+            assert next_time != INF, f"The 3 times are all inf, which is not possible."
+            current_time = next_time
+
+
+        if INFO_ON:
+            logger.info(f"[Time] batch finish time: {batch_finish_time} next req arrival time: {next_req_arrival_time} next check time: {next_check_time}")
 
-    return dropped_reqs
+
+        num_iters += 1
+
+
+        # if num_iters > 20:
+        #     break
+
+    return num_iters
 
 
 if __name__ == "__main__":
@@ -204,12 +370,12 @@ if __name__ == "__main__":
 
     
     # read throughput profile
-    with open('./runtimes_by_batch_size.csv', mode='r', newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            batch_size = int(row['bsize'])
-            runtime = float(row['mean_runtime_ms'])
-            batch_runtimes[batch_size] = runtime
+    # round_trip parsing gives the same floats as float() on each field
+    runtimes_df = pd.read_csv('./runtimes_by_batch_size.csv', usecols=['bsize', 'mean_runtime_ms'], float_precision='round_trip')
+    batch_runtimes.update(zip(runtimes_df['bsize'].tolist(), runtimes_df['mean_runtime_ms'].tolist()))
+    # only batch size 0 is padded, a gap in the profile should still fail with a KeyError
+    BATCH_RT = [0.0] + [batch_runtimes[batch_size] for batch_size in range(1, max(batch_runtimes) + 1)]
+    BATCH_RT_1 = BATCH_RT[1]
     # print(f"Batch runtimes: {batch_runtimes}")
     
     # Read arrival times
@@ -230,10 +396,7 @@ if __name__ == "__main__":
     # read slo factors
     slo_factors = []
     if args.slo_csv:
-        with open(args.slo_csv, mode='r', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                slo_factors.append(float(row['slo_factor']))
+        slo_factors = pd.read_csv(args.slo_csv, usecols=['slo_factor'], dtype={'slo_factor': 'float64'}, float_precision='round_trip')['slo_factor'].tolist()
     else:
         for i in range(num_reqs):
             # slo_factor = random.uniform(1.5, 25)
@@ -241,11 +404,20 @@ if __name__ == "__main__":
 
     
     # generate requests
+    requests = []
     for i in range(num_reqs):
         arrival_time = arrival_times[i] if not args.offline else 0
         slo_factor = slo_factors[i]
         request = Request(arrival_time, i, slo_factor)
-        future_requests.append(request)
+        requests.append(request)
+    future_requests = ArrivalQueue(requests)
+    # every request stays alive until the final report and none of them form cycles,
+    # move them out of the collector's generations so full collections stop rescanning them
+    # (CPython only, PyPy's collector has no freeze). Collect first so garbage left over
+    # from trace parsing is freed rather than frozen forever.
+    if hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
 
     arrival_times = {req.id: req.arrival_time for req in future_requests}
     # logger.info(f"arrival times: {arrival_times}")
@@ -261,6 +433,8 @@ if __name__ == "__main__":
     if args.scheduler == 'simple':
         scheduler = LargestBatchScheduler(max_batch_size=args.max_batch_size, batch_runtimes=batch_runtimes, logger=logger)
     elif args.scheduler == 'dynamic':
+        # imported here, it needs gurobipy which the simple scheduler does not
+        from scheduler.dynamic_scheduler import DynamicScheduler
         scheduler = DynamicScheduler(max_batch_size=args.max_batch_size, batch_runtimes=batch_runtimes, logger=logger)
     else:
         logger.error(f"Invalid scheduler name: {args.scheduler}")
@@ -277,10 +451,7 @@ if __name__ == "__main__":
         slo_suffix = f"-slo-{args.slo_factor}"
         batch_suffix = f"-batch-{args.max_batch_size}"
         json_filename = f'output/{args.scheduler}{preemption_suffix}{trace_suffix}{slo_suffix}{batch_suffix}_finished_reqs.json'
-    current_time = float(future_requests[0].arrival_time)
-
-    num_iters = 0;
-
+    current_time = float(future_requests.peek().arrival_time)
 
 
 
@@ -288,103 +459,11 @@ if __name__ == "__main__":
         fetch_new_requests(current_time, future_requests, queue)
         scheduler.offline_schedule(current_batch, queue, current_time, finished_requests)
     else:
-        while (True):
-
-            # check the event
-            if len(current_batch) == 0:
-                event = Event.NEW_REQS_ARRIVED
-            elif current_time == batch_finish_time:
-                event = Event.BATCH_FINISHED
-            else:
-                if not args.preemption:
-                    assert False, f"The event should not be check preemption at this time."
-                event = Event.CHECK_PREEMPTION
-    
-
-            logger.info("\n" + "-"*10  +  f"Current time: {current_time}" + f" ({event.value})" + "-"*10)
-            
-            # fetech new reqs
-            new_reqs = fetch_new_requests(current_time, future_requests, queue)
-            if len(new_reqs) > 0:
-                logger.info(f"[New requests] {new_reqs}")
-
-            # drop requests
-            drop_reqs = drop_requests(current_time, queue, finished_requests)
-            logger.info(f"[Dropped requests] {drop_reqs}")
-
-            logger.info(f"[Current batch] {[req.id for req in current_batch]}")
-            logger.info(f"[Queue] (size: {len(queue)}) {[req.id for req in queue]}")
-            # logger.info(f"[Queue] {queue.requests}")
-
-            # check if we need to do preemption
-            if (event == Event.CHECK_PREEMPTION and args.preemption):
-                # do something
-                logger.info(f"[Check preemption] at {current_time}")
-                do_preemption = scheduler.preempt(current_batch, queue, current_time, batch_finish_time)
-                if do_preemption:
-                    logger.info(f"[New scheduled batch] {[req.id for req in current_batch]}")
-                    duration = batch_runtimes[len(current_batch)]
-                    batch_finish_time = current_time + duration
-
-
-            # check if the current batch is finished
-            if event == Event.BATCH_FINISHED:
-                assert len(current_batch) > 0, f"The current batch should be finished at this time but the current batch is empty."
-                req_ids = []
-                
-                while len(current_batch) > 0:
-                    req = current_batch.pop()
-                    assert req.finish_time == current_time, f"The finish time of the request {req.id} is not correct."
-                    req_ids.append(req.id)
-                    finished_requests.append(req)
-                logger.info(f"[Batch finished] {req_ids}")
-                batch_finish_time = math.inf
-
-            # schedule the next batch
-            if event != Event.CHECK_PREEMPTION:
-                if len(queue) > 0:
-                    queue_at_each_interval[current_time] = {req.id: req.deadline - req.arrival_time for req in queue}
-                else:
-                    queue_at_each_interval[current_time] = {}
-
-                next_check_time, _ = scheduler.schedule(current_batch, queue, current_time)
-                if len(current_batch) > 0:
-                    logger.info(f"[Scheduled] {[req.id for req in current_batch]}")
-                    duration = batch_runtimes[len(current_batch)]
-                    batch_finish_time = current_time + duration
-                    # update the timestep in the current batch
-                    for req in current_batch:
-                        req.schedule(current_time, len(current_batch), batch_runtimes[len(current_batch)])
-                else:
-                    logger.info(f"[No batch scheduled] queue length: {len(queue)}")
-
-            # check if the trace is finished
-            if len(future_requests) == 0 and len(queue) == 0 and len(current_batch) == 0:
-                logger.info("Trace finished")
-                break
-            
-            # check what is the next event
-            next_req_arrival_time = future_requests[0].arrival_time if len(future_requests) > 0 else math.inf
-            assert not (batch_finish_time==math.inf and next_check_time == math.inf and next_req_arrival_time == math.inf), f"The 3 times are all inf, which is not possible."
-            current_time = min(next_check_time, batch_finish_time, next_req_arrival_time)
-            if not args.preemption and batch_finish_time != math.inf and next_req_arrival_time != math.inf:
-                current_time = batch_finish_time
-
-
-            logger.info(f"[Time] batch finish time: {batch_finish_time} next req arrival time: {next_req_arrival_time} next check time: {next_check_time}")
-
-
-            num_iters += 1
-
-
-            # if num_iters > 20:
-            #     break
-
+        run_sim(scheduler, queue, future_requests, current_batch, finished_requests, queue_at_each_interval, current_time, logger, args.preemption)
     
     # Write finished requests to JSON file
-    finished_requests_data = [req.__dict__ for req in finished_requests]
-    with open(json_filename, 'w') as jsonfile:
-        json.dump(finished_requests_data, jsonfile, indent=2)
+    finished_requests_data = [req.to_dict() for req in finished_requests]
+    write_json(finished_requests_data, json_filename)
 
     logger.info(f"Finished requests written to {json_filename}")
     
@@ -415,9 +494,12 @@ if __name__ == "__main__":
         queue_filename = f'./output/{args.scheduler}{preemption_suffix}{trace_suffix}{slo_suffix}{batch_suffix}_queue.json'
 
     # write queue to json
-    with open(queue_filename, 'w') as jsonfile:
-        json.dump(queue_at_each_interval, jsonfile, indent=2)
+    write_json(queue_at_each_interval, queue_filename)
 
+    # the main log is buffered, flush it before appending to the same file
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, BufferedFileHandler):
+            handler.flush_buffer()
     perf_handler = logging.FileHandler(perf_log_filename)
     perf_handler.setLevel(logging.INFO)
     
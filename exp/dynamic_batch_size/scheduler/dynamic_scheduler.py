@@ -33,7 +33,7 @@ class DynamicScheduler:
         """Function f that maps batch size to runtime"""
         return self.batch_runtimes.get(s_k, 0)
 
-    def preempt(self, current_batch: SortedQueue, queue: SortedQueue, current_time: float, batch_finish_time: float) -> bool:
+    def preempt(self, current_batch: list, queue: SortedQueue, current_time: float, batch_finish_time: float) -> bool:
         N = len(queue) + len(current_batch)
         assert len(queue) > 0 and len(current_batch) > 0, f"Queue and current batch size is not greater than 0: {len(queue)} and {len(current_batch)}"
         assert batch_finish_time != math.inf, f"Batch finish time is not math.inf: {batch_finish_time}"
@@ -41,13 +41,12 @@ class DynamicScheduler:
         # check the performance of finishing the current batch and schedule the remaining requests
         self.logger.info(f"Checking the performance of finishing the current batch and schedule the remaining requests")
         queue_copy = queue.copy()
-        while len(queue_copy) > 0 and queue_copy[0].deadline < batch_finish_time + self.get_batch_duration(1):
-            queue_copy.pop()
+        queue_copy.pop_before(batch_finish_time + self.get_batch_duration(1))
         if len(queue_copy) == 0:
             future_num_satisfied = len(current_batch)
             future_finish_time = batch_finish_time
         else:
-            _, future_solution = self.schedule(SortedQueue(), queue_copy, batch_finish_time)
+            _, future_solution = self.schedule([], queue_copy, batch_finish_time)
             future_obj = future_solution["obj"]
             future_max_completion_time = future_solution["max_completion_time"]
             future_num_satisfied = len(current_batch) + future_obj
@@ -56,7 +55,7 @@ class DynamicScheduler:
 
         # check the performance of preempting the current batch and schedule the remaining requests
         self.logger.info(f"Checking the performance of preempting the current batch")
-        preempt_batch = SortedQueue()
+        preempt_batch = []
         queue_copy = queue.copy()
         queue_copy.extend(current_batch)        
         _, preempt_solution = self.schedule(preempt_batch, queue_copy, current_time)
@@ -74,9 +73,11 @@ class DynamicScheduler:
                 req.preempt()
                 queue.append(req)
 
+            batch_size = len(preempt_batch)
+            batch_time = self.get_batch_duration(batch_size)
             for req in preempt_batch:
                 queue.remove(req)
-                req.schedule(current_time, len(preempt_batch), self.get_batch_duration(len(preempt_batch)))
+                req.schedule(current_time, batch_size, batch_time)
                 current_batch.append(req)
 
             assert len(current_batch) + len(queue) == N, f"Current batch and queue size is not equal to the original size: {len(current_batch)} + {len(queue)} and {N}"
@@ -86,7 +87,7 @@ class DynamicScheduler:
         return False
 
 
-    def schedule(self, current_batch: SortedQueue, queue: SortedQueue, current_time: float) -> float:
+    def schedule(self, current_batch: list, queue: SortedQueue, current_time: float) -> float:
         N = len(queue)
         B = self.max_batch_size
         req_deadlines = {req.id: req.deadline - current_time for req in queue}
@@ -134,7 +135,7 @@ class DynamicScheduler:
 
         return math.inf, result
 
-    def offline_schedule(self, current_batch: SortedQueue, queue: SortedQueue, current_time: float, finished_reqs: list) -> float:
+    def offline_schedule(self, current_batch: list, queue: SortedQueue, current_time: float, finished_reqs: list) -> float:
         current_time = 0
         queue_copy = queue.copy()
         self.schedule(current_batch, queue_copy, current_time)
@@ -152,7 +153,7 @@ class DynamicScheduler:
 
                 for id in batch:
                     req = queue.get_by_id(id)
-                    req.schedule(current_time, batch_size, self.batch_runtimes[batch_size])
+                    req.schedule(current_time, batch_size, batch_time)
                     finished_reqs.append(req)
                     queue.remove(req)
                     # self.logger.info(f"\tRequest {req.id}: time remaining: {req.deadline - currnet_time}")
@@ -21,13 +21,13 @@ class LargestBatchScheduler:
         self.logger = logger
 
 
-    def preempt(self, current_batch: SortedQueue, queue: SortedQueue, current_time: float, batch_finish_time: float) -> bool:
+    def preempt(self, current_batch: list, queue: SortedQueue, current_time: float, batch_finish_time: float) -> bool:
         size = len(current_batch) + len(queue)
         # copy the current batch and queue
         all_queue = queue.copy()
         all_queue.extend(current_batch)
 
-        new_batch = SortedQueue()
+        new_batch = []
         self.schedule(new_batch, all_queue, current_time)
 
         # if len(new_batch) < 3.03 * len(current_batch):
@@ -41,16 +41,18 @@ class LargestBatchScheduler:
             queue.extend(current_batch)
             current_batch.clear()
             current_batch.extend(new_batch)
+            batch_size = len(current_batch)
+            batch_time = self.batch_runtimes[batch_size]
             for req in current_batch:
                 queue.remove(req)
-                req.schedule(current_time, len(current_batch), self.batch_runtimes[len(current_batch)])
+                req.schedule(current_time, batch_size, batch_time)
                 
             assert len(queue) + len(current_batch) == size, f"Queue and current batch size is not equal to the original size: {len(queue)} + {len(current_batch)} and {size}"
 
             return True
 
 
-    def schedule(self, current_batch: SortedQueue, queue: SortedQueue, current_time: float) -> float:
+    def schedule(self, current_batch: list, queue: SortedQueue, current_time: float) -> float:
         assert len(current_batch) == 0, f"Current batch is not empty: {current_batch}"
 
         if len(queue) == 0:
@@ -58,13 +60,16 @@ class LargestBatchScheduler:
         
         largest_time_remaining = queue.requests[-1].deadline - current_time
         assert self.batch_runtimes[1] <= largest_time_remaining, f"The time remaining is not large enough for the smallest batch runtime: {largest_time_remaining} < {self.batch_runtimes[1]}"
+        info_on = self.logger.isEnabledFor(logging.INFO)
         largest_batch_size = 0
         while largest_batch_size+1 <= self.max_batch_size and largest_batch_size+1 <= len(queue) and self.batch_runtimes[largest_batch_size+1] <= queue.requests[-largest_batch_size-1].deadline - current_time:
             largest_batch_size += 1
-            req = queue.requests[-largest_batch_size]
-            self.logger.info(f"largest batch size: {largest_batch_size} req: {req.id} time remaining: {req.deadline - current_time} batch runtime: {self.batch_runtimes[largest_batch_size]}")
+            if info_on:
+                req = queue.requests[-largest_batch_size]
+                self.logger.info(f"largest batch size: {largest_batch_size} req: {req.id} time remaining: {req.deadline - current_time} batch runtime: {self.batch_runtimes[largest_batch_size]}")
 
-        self.logger.info(f"largest time remaining: {largest_time_remaining} largest feasible batch size: {largest_batch_size}")
+        if info_on:
+            self.logger.info(f"largest time remaining: {largest_time_remaining} largest feasible batch size: {largest_batch_size}")
 
         for i in range(largest_batch_size):
             req = queue.pop_right()
@@ -139,36 +144,41 @@ class LargestBatchScheduler:
                 
     #     return math.inf, None
 
-    def offline_schedule(self, current_batch: SortedQueue, queue: SortedQueue, current_time: float, finished_reqs: list) -> float:
+    def offline_schedule(self, current_batch: list, queue: SortedQueue, current_time: float, finished_reqs: list) -> float:
         current_time = 0
         num_batch = 0
+        # the deadline dump below is O(queue) per batch, only build it when it is logged
+        info_on = self.logger.isEnabledFor(logging.INFO)
         while len(queue) > 0:
-            self.logger.info(f"####### Batch: {num_batch} Time: {current_time} #######")
-            deadline = {req.id: req.deadline - current_time for req in queue}
-            self.logger.info(f"deadline: {deadline}")
+            if info_on:
+                self.logger.info(f"####### Batch: {num_batch} Time: {current_time} #######")
+                deadline = {req.id: req.deadline - current_time for req in queue}
+                self.logger.info(f"deadline: {deadline}")
 
             self.schedule(current_batch, queue, current_time)
             batch_size = len(current_batch)
             if batch_size > 0:
                 batch_time = self.batch_runtimes[batch_size]
-                self.logger.info(f"current batch (size: {batch_size}, time: {batch_time}): {[req.id for req in current_batch]}")
+                if info_on:
+                    self.logger.info(f"current batch (size: {batch_size}, time: {batch_time}): {[req.id for req in current_batch]}")
 
-                while len(current_batch) > 0:
-                    req = current_batch.pop()
-                    req.schedule(current_time, batch_size, self.batch_runtimes[batch_size])
+                for req in current_batch:
+                    req.schedule(current_time, batch_size, batch_time)
                     finished_reqs.append(req)
-                    self.logger.info(f"\tRequest {req.id}: time remaining: {req.deadline - current_time}")
+                    if info_on:
+                        self.logger.info(f"\tRequest {req.id}: time remaining: {req.deadline - current_time}")
+                current_batch.clear()
 
                 current_time += batch_time
                 num_batch += 1
 
-            while len(queue) > 0 and queue[0].deadline < current_time + self.batch_runtimes[1]:
-                req = queue.pop()
+            for req in queue.pop_before(current_time + self.batch_runtimes[1]):
                 req.get_dropped(current_time)
                 finished_reqs.append(req)
 
 
 
-            self.logger.info(f"--------------------------------")
+            if info_on:
+                self.logger.info(f"--------------------------------")
 
         return current_time
\ No newline at end of file
@@ -1,4 +1,5 @@
 import bisect
+import operator
 
 
 
@@ -8,23 +9,21 @@ class SortedQueue:
     A queue that maintains requests in ascending order by arrival_time.
     """
     def __init__(self, sort_by="deadline"):
+        if sort_by not in ("deadline", "arrival_time"):
+            raise ValueError(f"Invalid sort_by: {sort_by}")
         self.requests = []
+        # sort keys kept in parallel with self.requests, so inserts can bisect
+        # without rebuilding the key list every time
+        self._keys = []
         self.sort_by = sort_by
 
     def append(self, request):
         """
         Insert request at the correct position to maintain ascending order by deadline.
         """
-        # Find the insertion point to maintain sorted order
-        # Create a list of arrival times for comparison
-        if self.sort_by == "deadline":
-            deadlines = [req.deadline for req in self.requests]
-            insert_pos = bisect.bisect_right(deadlines, request.deadline)
-        elif self.sort_by == "arrival_time":
-            arrival_times = [req.arrival_time for req in self.requests]
-            insert_pos = bisect.bisect_right(arrival_times, request.arrival_time)
-        else:
-            raise ValueError(f"Invalid sort_by: {self.sort_by}")
+        key = getattr(request, self.sort_by)
+        insert_pos = bisect.bisect_right(self._keys, key)
+        self._keys.insert(insert_pos, key)
         self.requests.insert(insert_pos, request)
     
     # def get_request_by_earliest_arrival_time(self):
@@ -46,6 +45,7 @@ class SortedQueue:
         Remove and return the request with the earliest arrival_time.
         """
         if self.requests:
+            self._keys.pop(0)
             return self.requests.pop(0)
         raise IndexError("Queue is empty")
 
@@ -54,14 +54,28 @@ class SortedQueue:
         Remove and return the request with the latest deadline.
         """
         if self.requests:
+            self._keys.pop()
             return self.requests.pop()
         raise IndexError("Queue is empty")
+
+    def pop_before(self, key):
+        """
+        Remove and return, in order, all requests whose sort key is strictly less than key.
+        """
+        end = bisect.bisect_left(self._keys, key)
+        if end == 0:
+            return []
+        popped = self.requests[:end]
+        del self.requests[:end]
+        del self._keys[:end]
+        return popped
     
     def clear(self):
         """
         Remove all items from the queue.
         """
         self.requests.clear()
+        self._keys.clear()
     
     def __len__(self):
         return len(self.requests)
@@ -82,22 +96,83 @@ class SortedQueue:
         """
         Remove a specific request from the queue.
         """
-        self.requests.remove(request)
+        # only requests with an equal key can be the one we are looking for
+        key = getattr(request, self.sort_by)
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_right(self._keys, key, lo=start)
+        for pos in range(start, end):
+            if self.requests[pos] is request:
+                del self.requests[pos]
+                del self._keys[pos]
+                return
+        raise ValueError("SortedQueue.remove(x): x not in queue")
     
     def copy(self):
         """
         Create a shallow copy of the queue.
         """
-        new_queue = SortedQueue()
+        new_queue = SortedQueue(sort_by=self.sort_by)
         new_queue.requests = self.requests.copy()
+        new_queue._keys = self._keys.copy()
         return new_queue
     
     def extend(self, items):
         """
         Add multiple items to the queue in sorted order.
         """
-        for item in items:
-            self.append(item)
+        items = list(items)
+        # a few items: bisect each one in
+        if len(items) * 4 <= len(self.requests):
+            for item in items:
+                self.append(item)
+            return
+        # a burst (e.g. all requests arriving at once): merge in bulk instead of shifting the list per item.
+        # The sort is stable, so ties keep the same order as appending one by one.
+        key = operator.attrgetter(self.sort_by)
+        self.requests.extend(items)
+        self.requests.sort(key=key)
+        self._keys = [key(req) for req in self.requests]
+
+    def __repr__(self):
+        return f"SortedQueue(requests={self.requests})"
+
+
+class ArrivalQueue:
+    """
+    Requests sorted once by arrival_time and released in order as the simulation time advances.
+    Fetching is a binary search over the arrival times plus a slice, instead of one pop per request.
+    Plain lists + bisect, so this runs as fast under PyPy as under CPython.
+    """
+    def __init__(self, requests=()):
+        # stable sort, so requests with the same arrival_time keep their id order
+        self.requests = sorted(requests, key=lambda req: req.arrival_time)
+        self.arrival_times = [req.arrival_time for req in self.requests]
+        self.cursor = 0
+
+    def fetch(self, current_time):
+        """
+        Remove and return all requests that arrived at or before current_time.
+        """
+        end = bisect.bisect_right(self.arrival_times, current_time, lo=self.cursor)
+        if end <= self.cursor:
+            return []
+        arrived = self.requests[self.cursor:end]
+        self.cursor = end
+        return arrived
+
+    def peek(self):
+        """
+        Return the next request to arrive without removing it.
+        """
+        if self.cursor < len(self.requests):
+            return self.requests[self.cursor]
+        raise IndexError("Queue is empty")
+
+    def __len__(self):
+        return len(self.requests) - self.cursor
+
+    def __iter__(self):
+        return iter(self.requests[self.cursor:])
 
     def __repr__(self):
-        return f"SortedQueue(requests={self.requests})"
\ No newline at end of file
+        return f"ArrivalQueue(requests={self.requests[self.cursor:]})"
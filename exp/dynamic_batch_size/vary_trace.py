@@ -3,7 +3,6 @@ This script is used to generate the customized trace for the simulation, based o
 """
 import random
 import pandas as pd
-import matplotlib.pyplot as plt
 import argparse
 import numpy as np
 
@@ -54,6 +53,9 @@ def plot_trace_pattern(arrival_times, bin_width=1.0):
     @param bin_width: the width of the bins, default is 1.0 second
     @return: None
     '''
+    # imported here so that importing the trace generators (e.g. from main.py) does not load matplotlib
+    import matplotlib.pyplot as plt
+
     # Convert from microseconds to seconds 
     np_arrival_times = np.array(arrival_times)
     np_arrival_times = np_arrival_times * 1.0 / 1e3